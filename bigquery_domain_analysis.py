@@ -16,18 +16,28 @@ Last Modified: 2025-11-20
 """
 
 import sys
+import time
+import hashlib
+import tempfile
 import logging
+import threading
 from pathlib import Path
-from datetime import datetime, timedelta
-from typing import Tuple, Optional
+from datetime import datetime, timedelta, timezone
+from typing import List, NamedTuple, Tuple, Optional
 import os
 
 try:
     from google.cloud import bigquery
+    from google.cloud import bigquery_storage
+    from google.oauth2 import service_account
+    import numpy as np
     import pandas as pd
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.feather as feather
 except ImportError as e:
     print(f"ERROR: Missing required package: {e}")
-    print("Please install requirements: pip install google-cloud-bigquery pandas db-dtypes")
+    print("Please install requirements: pip install -r requirements.txt")
     sys.exit(1)
 
 
@@ -40,6 +50,22 @@ PROJECT_ID = "iab-publisher-data"
 DATASET_ID = "dap_daily"
 TABLE_ID = "dap_domain"
 
+# Columns of the pivoted domain query kept in the DataFrame
+METRIC_COLUMNS = ['domain_name', 'prev_users', 'latest_users', 'prev_views', 'latest_views']
+
+# Data columns of the CSV report, in output order (metadata columns follow)
+CSV_DATA_COLUMNS = [
+    'domain_name',
+    'prev_users', 'latest_users', 'users_change', 'users_pct_change',
+    'prev_views', 'latest_views', 'views_change', 'views_pct_change'
+]
+
+# Only dates within this many days are considered (enables partition pruning)
+QUERY_LOOKBACK_DAYS = 3
+
+# Safety cap on bytes billed per query (10 GiB)
+MAX_BYTES_BILLED = 10 * 1024 ** 3
+
 # Credentials - Service account JSON file
 CREDENTIALS_PATH = os.path.expanduser("~/iab-5d3c53b40c41.json")
 
@@ -48,6 +74,10 @@ BASE_OUTPUT_DIR = Path.home() / "Downloads" / "domain_reports"
 LOGS_DIR = BASE_OUTPUT_DIR / "logs"
 RETENTION_DAYS = 30
 
+# Query result cache - lets repeated runs (e.g. backfills) skip BigQuery
+CACHE_DIR = Path.home() / ".cache" / "domain_reports"
+CACHE_TTL_SECONDS = 300
+
 # ============================================================================
 # LOGGING SETUP
 # ============================================================================
@@ -92,25 +122,29 @@ def ensure_directories() -> None:
     """Create necessary directories if they don't exist."""
     BASE_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     LOGS_DIR.mkdir(parents=True, exist_ok=True)
-    logger.info(f"Output directory: {BASE_OUTPUT_DIR}")
-    logger.info(f"Logs directory: {LOGS_DIR}")
+    logger.info("Output directory: %s", BASE_OUTPUT_DIR)
+    logger.info("Logs directory: %s", LOGS_DIR)
 
 
 def cleanup_old_files() -> None:
     """Remove files older than RETENTION_DAYS."""
-    cutoff_date = datetime.now() - timedelta(days=RETENTION_DAYS)
-    deleted_count = 0
-    
-    for file_path in BASE_OUTPUT_DIR.glob("domain_analysis_*"):
-        if file_path.is_file():
-            file_mtime = datetime.fromtimestamp(file_path.stat().st_mtime)
-            if file_mtime < cutoff_date:
-                file_path.unlink()
-                deleted_count += 1
-                logger.info(f"Deleted old file: {file_path.name}")
-    
-    if deleted_count > 0:
-        logger.info(f"Cleanup complete: {deleted_count} old files removed")
+    cutoff_ts = (datetime.now() - timedelta(days=RETENTION_DAYS)).timestamp()
+    deleted_names = []
+    
+    with os.scandir(BASE_OUTPUT_DIR) as entries:
+        for entry in entries:
+            if not entry.name.startswith("domain_analysis_") or not entry.is_file():
+                continue
+            if entry.stat().st_mtime < cutoff_ts:
+                os.unlink(entry.path)
+                deleted_names.append(entry.name)
+    
+    if deleted_names:
+        # Log one summary line (first 20 names) instead of one line per file
+        logger.info(
+            "Cleanup complete: %d old files removed: %s",
+            len(deleted_names), ", ".join(deleted_names[:20])
+        )
     else:
         logger.info("Cleanup complete: No old files to remove")
 
@@ -132,116 +166,279 @@ def get_output_filenames() -> Tuple[Path, Path]:
 # BIGQUERY OPERATIONS
 # ============================================================================
 
-def get_bigquery_client() -> bigquery.Client:
+# Clients are created once per process and shared by later calls
+_CLIENTS: Optional[Tuple[bigquery.Client, bigquery_storage.BigQueryReadClient]] = None
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_bigquery_client() -> Tuple[bigquery.Client, bigquery_storage.BigQueryReadClient]:
     """
-    Initialize BigQuery client with service account credentials.
+    Get BigQuery and BigQuery Storage clients with service account credentials.
+    
+    The Storage client streams query results as Arrow record batches over
+    gRPC instead of paging JSON through the REST API. Both clients are
+    created on first use and reused afterwards, keeping the gRPC channel and
+    OAuth token warm if the script is run as a long-lived process.
     
     Returns:
-        Authenticated BigQuery client
+        Tuple of (BigQuery client, BigQuery Storage read client)
         
     Raises:
         FileNotFoundError: If credentials file doesn't exist
         Exception: If authentication fails
     """
-    creds_path = Path(CREDENTIALS_PATH)
+    global _CLIENTS
     
-    if not creds_path.exists():
-        raise FileNotFoundError(
-            f"Credentials file not found: {CREDENTIALS_PATH}\n"
-            f"Please update CREDENTIALS_PATH in the script to point to your "
-            f"service account JSON file."
-        )
+    with _CLIENTS_LOCK:
+        if _CLIENTS is not None:
+            return _CLIENTS
+        
+        creds_path = Path(CREDENTIALS_PATH)
+        
+        if not creds_path.exists():
+            raise FileNotFoundError(
+                f"Credentials file not found: {CREDENTIALS_PATH}\n"
+                f"Please update CREDENTIALS_PATH in the script to point to your "
+                f"service account JSON file."
+            )
+        
+        logger.info("Using credentials: %s", CREDENTIALS_PATH)
+        
+        try:
+            credentials = service_account.Credentials.from_service_account_file(str(creds_path))
+            client = bigquery.Client(credentials=credentials, project=PROJECT_ID)
+            bqstorage_client = bigquery_storage.BigQueryReadClient(credentials=credentials)
+            logger.info("Connected to BigQuery project: %s", PROJECT_ID)
+        except Exception as e:
+            logger.error("Failed to authenticate with BigQuery: %s", e)
+            raise
+        
+        _CLIENTS = (client, bqstorage_client)
+        return _CLIENTS
+
+
+def get_cache_path(query: str) -> Path:
+    """
+    Get the result cache file for the configured table and query.
     
-    logger.info(f"Using credentials: {CREDENTIALS_PATH}")
+    A short hash of the query text is part of the file name, so changing the
+    SQL or a setting interpolated into it never reuses an older result. The
+    lookback cutoff is inlined as a date literal, so the key also changes
+    when the UTC date (and with it the lookback window) rolls over.
     
-    try:
-        client = bigquery.Client.from_service_account_json(
-            str(creds_path),
-            project=PROJECT_ID
-        )
-        logger.info(f"Connected to BigQuery project: {PROJECT_ID}")
-        return client
-    except Exception as e:
-        logger.error(f"Failed to authenticate with BigQuery: {e}")
-        raise
+    Args:
+        query: SQL query whose result is cached
+        
+    Returns:
+        Path of the cache file
+    """
+    query_hash = hashlib.sha256(query.encode("utf-8")).hexdigest()[:12]
+    return CACHE_DIR / f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}.{query_hash}.arrow"
 
 
-def get_recent_dates(client: bigquery.Client) -> Tuple[str, str]:
+def load_cached_result(query: str) -> Optional[pa.Table]:
     """
-    Find the two most recent dates in the dataset.
+    Load the cached query result if it is younger than CACHE_TTL_SECONDS.
     
     Args:
-        client: Authenticated BigQuery client
+        query: SQL query whose result is cached
         
     Returns:
-        Tuple of (previous_date, latest_date) as strings
-        
-    Raises:
-        ValueError: If insufficient data is available
+        Cached Arrow table, or None if missing, expired, unreadable or
+        missing expected columns
     """
-    query = f"""
-    SELECT DISTINCT DATE(date) as date
-    FROM `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}`
-    ORDER BY date DESC
-    LIMIT 2
+    cache_path = get_cache_path(query)
+    
+    try:
+        age = time.time() - cache_path.stat().st_mtime
+        if age > CACHE_TTL_SECONDS:
+            return None
+        table = feather.read_table(str(cache_path))
+    except FileNotFoundError:
+        return None
+    except (OSError, pa.ArrowException) as e:
+        logger.warning("Ignoring unreadable cache file %s: %s", cache_path, e)
+        return None
+    
+    missing = set(METRIC_COLUMNS + ['previous_date', 'latest_date']) - set(table.column_names)
+    if missing:
+        logger.warning("Ignoring cache file %s missing columns: %s", cache_path, sorted(missing))
+        return None
+    
+    logger.info("Using cached query result (%.0fs old): %s", age, cache_path)
+    return table
+
+
+def save_cached_result(query: str, table: pa.Table) -> None:
     """
+    Atomically write the query result to the cache file.
     
-    logger.info("Querying for most recent dates...")
+    The table is written to a uniquely named temporary file first, so
+    overlapping runs never write to the same file before the os.replace.
+    
+    Args:
+        query: SQL query whose result is cached
+        table: Arrow table returned by the query
+    """
+    cache_path = get_cache_path(query)
+    tmp_path = None
     
     try:
-        df = client.query(query).to_dataframe()
-        
-        if len(df) < 2:
-            raise ValueError(
-                f"Insufficient data: Found {len(df)} dates, need at least 2 for comparison"
-            )
-        
-        latest_date = df.iloc[0]['date'].strftime('%Y-%m-%d')
-        previous_date = df.iloc[1]['date'].strftime('%Y-%m-%d')
-        
-        logger.info(f"Latest date: {latest_date}")
-        logger.info(f"Previous date: {previous_date}")
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=CACHE_DIR, prefix=f"{cache_path.name}.", suffix=".tmp", delete=False
+        ) as tmp_file:
+            tmp_path = tmp_file.name
+        feather.write_feather(table, tmp_path)
+        os.replace(tmp_path, cache_path)
+    except (OSError, pa.ArrowException) as e:
+        logger.warning("Failed to write cache file %s: %s", cache_path, e)
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def run_query(
+    client: bigquery.Client,
+    bqstorage_client: bigquery_storage.BigQueryReadClient,
+    query: str
+) -> pa.Table:
+    """
+    Run a query after a dry run check and download the result as Arrow.
+    
+    The dry run is free and reports the bytes the query would scan, so an
+    unexpectedly large scan fails before any slots are spent. The real job
+    can be served from the BigQuery result cache and is capped by
+    MAX_BYTES_BILLED.
+    
+    Args:
+        client: Authenticated BigQuery client
+        bqstorage_client: BigQuery Storage read client for result download
+        query: SQL query to run
         
-        return previous_date, latest_date
+    Returns:
+        Query result as an Arrow table
         
-    except Exception as e:
-        logger.error(f"Failed to retrieve dates: {e}")
-        raise
+    Raises:
+        ValueError: If the query would scan more than MAX_BYTES_BILLED
+    """
+    dry_run_job = client.query(query, job_config=bigquery.QueryJobConfig(dry_run=True))
+    bytes_processed = dry_run_job.total_bytes_processed or 0
+    logger.info("Query will process %s bytes", format_number(bytes_processed))
+    
+    if bytes_processed > MAX_BYTES_BILLED:
+        raise ValueError(
+            f"Query would process {bytes_processed:,} bytes, "
+            f"above MAX_BYTES_BILLED ({MAX_BYTES_BILLED:,})"
+        )
+    
+    job_config = bigquery.QueryJobConfig(
+        use_query_cache=True,
+        priority=bigquery.QueryPriority.INTERACTIVE,
+        maximum_bytes_billed=MAX_BYTES_BILLED
+    )
+    query_job = client.query(query, job_config=job_config)
+    table = query_job.result().to_arrow(bqstorage_client=bqstorage_client)
+    
+    if query_job.cache_hit:
+        logger.info("Query served from BigQuery result cache")
+    
+    return table
 
 
-def extract_domain_data(client: bigquery.Client, previous_date: str, latest_date: str) -> pd.DataFrame:
+def extract_domain_data(
+    client: bigquery.Client,
+    bqstorage_client: bigquery_storage.BigQueryReadClient
+) -> Tuple[pd.DataFrame, str, str]:
     """
-    Extract and aggregate domain data for the two most recent dates.
+    Extract per-domain metrics for the two most recent dates in one query.
+    
+    Only the last QUERY_LOOKBACK_DAYS days are scanned. The two most recent
+    dates in that window are found with DENSE_RANK and the per-date
+    totals are pivoted into side-by-side columns by conditional aggregation,
+    so BigQuery returns one merge-ready row per domain. Results are downloaded
+    through the Storage API into Arrow-backed columns and cached on disk for
+    CACHE_TTL_SECONDS so repeated runs reuse them.
     
     Args:
         client: Authenticated BigQuery client
-        previous_date: Previous date string (YYYY-MM-DD)
-        latest_date: Latest date string (YYYY-MM-DD)
+        bqstorage_client: BigQuery Storage read client for result download
         
     Returns:
-        DataFrame with aggregated domain metrics
+        Tuple of (DataFrame with prev/latest users and views per domain,
+        previous_date, latest_date) with dates as YYYY-MM-DD strings
+        
+    Raises:
+        ValueError: If insufficient data is available
     """
+    # Cutoff as a literal (not CURRENT_DATE()) keeps the query deterministic,
+    # so BigQuery can serve it from its result cache
+    cutoff_date = (
+        datetime.now(timezone.utc).date() - timedelta(days=QUERY_LOOKBACK_DAYS)
+    ).isoformat()
+    
     query = f"""
-    SELECT 
-        DATE(date) as date,
+    WITH daily AS (
+        SELECT
+            DATE(date) AS dt,
+            domain_name,
+            IFNULL(SUM(total_activeUsers), 0) AS users,
+            IFNULL(SUM(total_screenPageViews), 0) AS views
+        FROM `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}`
+        WHERE DATE(date) >= DATE '{cutoff_date}'
+        GROUP BY dt, domain_name
+        QUALIFY DENSE_RANK() OVER (ORDER BY dt DESC) <= 2
+    ),
+    bounds AS (
+        SELECT MIN(dt) AS previous_date, MAX(dt) AS latest_date
+        FROM daily
+    )
+    SELECT
         domain_name,
-        SUM(total_activeUsers) as total_activeUsers,
-        SUM(total_screenPageViews) as total_screenPageViews
-    FROM `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}`
-    WHERE DATE(date) IN ('{previous_date}', '{latest_date}')
-    GROUP BY date, domain_name
-    ORDER BY domain_name, date
+        SUM(IF(dt = previous_date, users, 0)) AS prev_users,
+        SUM(IF(dt = latest_date, users, 0)) AS latest_users,
+        SUM(IF(dt = previous_date, views, 0)) AS prev_views,
+        SUM(IF(dt = latest_date, views, 0)) AS latest_views,
+        ANY_VALUE(previous_date) AS previous_date,
+        ANY_VALUE(latest_date) AS latest_date
+    FROM daily
+    CROSS JOIN bounds
+    GROUP BY domain_name
+    ORDER BY domain_name
     """
     
-    logger.info("Extracting domain data from BigQuery...")
+    logger.info("Extracting domain data for the two most recent dates...")
     
     try:
-        df = client.query(query).to_dataframe()
-        logger.info(f"Retrieved {len(df)} records")
-        return df
+        table = load_cached_result(query)
+        from_cache = table is not None
+        if not from_cache:
+            table = run_query(client, bqstorage_client, query)
+        
+        if table.num_rows == 0 or table['previous_date'][0] == table['latest_date'][0]:
+            found = 0 if table.num_rows == 0 else 1
+            raise ValueError(
+                f"Insufficient data: Found {found} dates, need at least 2 for comparison "
+                f"(searched the last {QUERY_LOOKBACK_DAYS} days)"
+            )
+        
+        previous_date = table['previous_date'][0].as_py().strftime('%Y-%m-%d')
+        latest_date = table['latest_date'][0].as_py().strftime('%Y-%m-%d')
+        
+        # Convert only the metric columns: domain_name stays a contiguous Arrow
+        # string column (string[pyarrow]) and the counts stay int64[pyarrow]
+        df = table.select(METRIC_COLUMNS).to_pandas(types_mapper=pd.ArrowDtype)
+        
+        if not from_cache:
+            save_cached_result(query, table)
+        
+        logger.info("Latest date: %s", latest_date)
+        logger.info("Previous date: %s", previous_date)
+        logger.info("Retrieved %d domains", len(df))
+        
+        return df, previous_date, latest_date
         
     except Exception as e:
-        logger.error(f"Failed to extract data: {e}")
+        logger.error("Failed to extract data: %s", e)
         raise
 
 
@@ -249,70 +446,55 @@ def extract_domain_data(client: bigquery.Client, previous_date: str, latest_date
 # DATA PROCESSING
 # ============================================================================
 
-def calculate_changes(df: pd.DataFrame, previous_date: str, latest_date: str) -> pd.DataFrame:
+def percent_change(change: np.ndarray, base: np.ndarray) -> np.ndarray:
+    """
+    Calculate percentage change, using 0 where the base value is 0.
+    
+    Args:
+        change: Absolute change values
+        base: Base (previous) values
+        
+    Returns:
+        Float array of percentage changes
+    """
+    pct = np.zeros(change.shape, dtype=np.float64)
+    np.divide(change, base, out=pct, where=base != 0)
+    pct *= 100
+    return pct
+
+
+def calculate_changes(df: pd.DataFrame) -> pd.DataFrame:
     """
     Calculate day-over-day changes for each domain.
     
     Args:
-        df: DataFrame with domain data
-        previous_date: Previous date string
-        latest_date: Latest date string
+        df: DataFrame with zero-filled prev/latest users and views per domain
+            (change columns are added to it in place)
         
     Returns:
-        DataFrame with change metrics
+        The same DataFrame with change metrics
     """
     logger.info("Calculating day-over-day changes...")
     
-    # Convert date column to string for comparison
-    df['date'] = df['date'].astype(str)
-    
-    # Split into previous and latest dataframes
-    prev_df = df[df['date'] == previous_date].copy()
-    latest_df = df[df['date'] == latest_date].copy()
-    
-    # Rename columns for clarity
-    prev_df = prev_df.rename(columns={
-        'total_activeUsers': 'prev_users',
-        'total_screenPageViews': 'prev_views'
-    })
-    latest_df = latest_df.rename(columns={
-        'total_activeUsers': 'latest_users',
-        'total_screenPageViews': 'latest_views'
-    })
-    
-    # Merge on domain_name
-    merged = pd.merge(
-        prev_df[['domain_name', 'prev_users', 'prev_views']],
-        latest_df[['domain_name', 'latest_users', 'latest_views']],
-        on='domain_name',
-        how='outer'
-    )
+    # Calculate changes on the underlying arrays (already zero-filled by the query)
+    prev_users = df['prev_users'].to_numpy(dtype=np.int64)
+    latest_users = df['latest_users'].to_numpy(dtype=np.int64)
+    prev_views = df['prev_views'].to_numpy(dtype=np.int64)
+    latest_views = df['latest_views'].to_numpy(dtype=np.int64)
     
-    # Fill NaN values with 0 (for domains that only appear in one date)
-    merged = merged.fillna(0)
+    users_change = latest_users - prev_users
+    views_change = latest_views - prev_views
     
-    # Calculate changes
-    merged['users_change'] = merged['latest_users'] - merged['prev_users']
-    merged['users_pct_change'] = (
-        (merged['users_change'] / merged['prev_users'] * 100)
-        .replace([float('inf'), -float('inf')], 0)
-        .fillna(0)
-    )
+    # Add change columns in place (df is owned by the caller's pipeline, so
+    # there is no need for assign() to copy the existing columns first)
+    df['users_change'] = users_change
+    df['users_pct_change'] = percent_change(users_change, prev_users)
+    df['views_change'] = views_change
+    df['views_pct_change'] = percent_change(views_change, prev_views)
     
-    merged['views_change'] = merged['latest_views'] - merged['prev_views']
-    merged['views_pct_change'] = (
-        (merged['views_change'] / merged['prev_views'] * 100)
-        .replace([float('inf'), -float('inf')], 0)
-        .fillna(0)
-    )
-    
-    # Convert to integers where appropriate
-    for col in ['prev_users', 'latest_users', 'users_change', 'prev_views', 'latest_views', 'views_change']:
-        merged[col] = merged[col].astype(int)
-    
-    logger.info(f"Calculated changes for {len(merged)} domains")
+    logger.info("Calculated changes for %d domains", len(df))
     
-    return merged
+    return df
 
 
 # ============================================================================
@@ -335,23 +517,111 @@ def get_arrow(change: int) -> str:
     return "↑" if change > 0 else "↓" if change < 0 else "→"
 
 
-def create_users_table(df: pd.DataFrame, previous_date: str, latest_date: str) -> str:
+def top_abs_positions(values: np.ndarray, k: int = 10) -> np.ndarray:
     """
-    Create formatted table for top 10 domains by active users change.
+    Find positions of the k largest values by absolute magnitude.
+    
+    Uses a linear-time partition to find the k-th largest magnitude and only
+    sorts the positions at or above it. Ties are broken by position (earlier
+    rows first), matching the order of DataFrame.nlargest.
+    
+    Args:
+        values: Array of change values
+        k: Number of positions to return
+        
+    Returns:
+        Positional indices ordered by descending absolute value
+    """
+    abs_values = np.abs(values)
+    k = min(k, abs_values.size)
+    if k == 0:
+        return np.arange(0)
+    kth_value = np.partition(abs_values, -k)[-k]
+    positions = np.flatnonzero(abs_values >= kth_value)
+    return positions[np.argsort(-abs_values[positions], kind='stable')][:k]
+
+
+class ChangeSummary(NamedTuple):
+    """Top positions and summary counts for one change column."""
+    top_positions: np.ndarray
+    gainers: int
+    decliners: int
+    total_change: int
+
+
+def summarize_changes(changes: np.ndarray, top_positions: np.ndarray) -> ChangeSummary:
+    """
+    Bundle top positions with gainer/decliner totals for one change column.
+    
+    Args:
+        changes: Array of change values
+        top_positions: Positions of the top rows by absolute change
+        
+    Returns:
+        ChangeSummary for the array
+    """
+    return ChangeSummary(
+        top_positions=top_positions,
+        gainers=int((changes > 0).sum()),
+        decliners=int((changes < 0).sum()),
+        total_change=int(changes.sum())
+    )
+
+
+class ReportSelections(NamedTuple):
+    """Row selections shared by the TXT and CSV reports."""
+    csv_order: np.ndarray
+    users: ChangeSummary
+    views: ChangeSummary
+
+
+def select_report_rows(df: pd.DataFrame, k: int = 10) -> ReportSelections:
+    """
+    Compute the CSV row order and both top-k table selections once.
+    
+    The users_change sort for the CSV is done here once and shared, so
+    save_csv_report does not sort again. Each top table is picked with
+    top_abs_positions, which breaks ties by row position.
     
     Args:
         df: DataFrame with change metrics
-        previous_date: Previous date string (YYYY-MM-DD)
-        latest_date: Latest date string (YYYY-MM-DD)
+        k: Number of rows in each top table
         
     Returns:
-        Formatted table string
+        ReportSelections for both reports
+    """
+    users_changes = df['users_change'].to_numpy()
+    views_changes = df['views_change'].to_numpy()
+    
+    csv_order = np.argsort(-users_changes, kind='stable')
+    
+    return ReportSelections(
+        csv_order=csv_order,
+        users=summarize_changes(users_changes, top_abs_positions(users_changes, k)),
+        views=summarize_changes(views_changes, top_abs_positions(views_changes, k))
+    )
+
+
+def append_users_table(
+    lines: List[str],
+    df: pd.DataFrame,
+    summary: ChangeSummary,
+    previous_date: str,
+    latest_date: str
+) -> None:
     """
-    # Sort by ABSOLUTE change and take top 10
-    df['users_change_abs'] = df['users_change'].abs()
-    top_10 = df.nlargest(10, 'users_change_abs', keep='all')
+    Append formatted table for top 10 domains by active users change.
+    
+    Args:
+        lines: Report lines to append to
+        df: DataFrame with change metrics
+        summary: Precomputed top positions and totals for the change column
+        previous_date: Previous date string (YYYY-MM-DD)
+        latest_date: Latest date string (YYYY-MM-DD)
+    """
+    # Top 10 by ABSOLUTE change
+    top_10 = df.iloc[summary.top_positions]
     
-    lines = []
     lines.append("\n" + "=" * 120)
     lines.append("TABLE 1: TOP 10 DOMAINS BY ACTIVE USERS CHANGE (BY ABSOLUTE VOLUME)")
     lines.append("=" * 120)
@@ -376,33 +646,33 @@ def create_users_table(df: pd.DataFrame, previous_date: str, latest_date: str) -
     
     # Summary
     lines.append("-" * 120)
-    gainers = len(df[df['users_change'] > 0])
-    decliners = len(df[df['users_change'] < 0])
-    total_change = df['users_change'].sum()
-    
-    lines.append(f"Summary: {gainers} gainers, {decliners} decliners | Total change: {format_number(total_change)}")
+    lines.append(
+        f"Summary: {summary.gainers} gainers, {summary.decliners} decliners | "
+        f"Total change: {format_number(summary.total_change)}"
+    )
     lines.append("=" * 120)
-    
-    return "\n".join(lines)
 
 
-def create_views_table(df: pd.DataFrame, previous_date: str, latest_date: str) -> str:
+def append_views_table(
+    lines: List[str],
+    df: pd.DataFrame,
+    summary: ChangeSummary,
+    previous_date: str,
+    latest_date: str
+) -> None:
     """
-    Create formatted table for top 10 domains by pageviews change.
+    Append formatted table for top 10 domains by pageviews change.
     
     Args:
+        lines: Report lines to append to
         df: DataFrame with change metrics
+        summary: Precomputed top positions and totals for the change column
         previous_date: Previous date string (YYYY-MM-DD)
         latest_date: Latest date string (YYYY-MM-DD)
-        
-    Returns:
-        Formatted table string
     """
-    # Sort by ABSOLUTE change and take top 10
-    df['views_change_abs'] = df['views_change'].abs()
-    top_10 = df.nlargest(10, 'views_change_abs', keep='all')
+    # Top 10 by ABSOLUTE change
+    top_10 = df.iloc[summary.top_positions]
     
-    lines = []
     lines.append("\n" + "=" * 120)
     lines.append("TABLE 2: TOP 10 DOMAINS BY PAGEVIEWS CHANGE (BY ABSOLUTE VOLUME)")
     lines.append("=" * 120)
@@ -427,82 +697,98 @@ def create_views_table(df: pd.DataFrame, previous_date: str, latest_date: str) -
     
     # Summary
     lines.append("-" * 120)
-    gainers = len(df[df['views_change'] > 0])
-    decliners = len(df[df['views_change'] < 0])
-    total_change = df['views_change'].sum()
-    
-    lines.append(f"Summary: {gainers} gainers, {decliners} decliners | Total change: {format_number(total_change)}")
+    lines.append(
+        f"Summary: {summary.gainers} gainers, {summary.decliners} decliners | "
+        f"Total change: {format_number(summary.total_change)}"
+    )
     lines.append("=" * 120)
-    
-    return "\n".join(lines)
 
 
-def save_txt_report(df: pd.DataFrame, txt_path: Path, previous_date: str, latest_date: str) -> None:
+def save_txt_report(
+    df: pd.DataFrame,
+    selections: ReportSelections,
+    txt_path: Path,
+    previous_date: str,
+    latest_date: str
+) -> None:
     """
     Save formatted text report.
     
     Args:
         df: DataFrame with change metrics
+        selections: Precomputed top rows and totals for both tables
         txt_path: Output file path
         previous_date: Previous date string
         latest_date: Latest date string
     """
-    with open(txt_path, 'w') as f:
-        # Header
-        f.write("=" * 120 + "\n")
-        f.write("BIGQUERY DOMAIN ANALYSIS REPORT\n")
-        f.write("=" * 120 + "\n")
-        f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"Data Range: {previous_date} to {latest_date}\n")
-        f.write(f"Total Domains Analyzed: {len(df)}\n")
-        
-        # Tables
-        f.write(create_users_table(df, previous_date, latest_date))
-        f.write("\n\n")
-        f.write(create_views_table(df, previous_date, latest_date))
-        f.write("\n\n")
-        
-        # Footer
-        f.write("=" * 120 + "\n")
-        f.write("End of Report\n")
-        f.write("=" * 120 + "\n")
+    lines: List[str] = []
+    
+    # Header
+    lines.append("=" * 120)
+    lines.append("BIGQUERY DOMAIN ANALYSIS REPORT")
+    lines.append("=" * 120)
+    lines.append(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    lines.append(f"Data Range: {previous_date} to {latest_date}")
+    lines.append(f"Total Domains Analyzed: {len(df)}")
+    
+    # Tables
+    append_users_table(lines, df, selections.users, previous_date, latest_date)
+    lines.append("")
+    append_views_table(lines, df, selections.views, previous_date, latest_date)
+    lines.append("")
+    
+    # Footer
+    lines.append("=" * 120)
+    lines.append("End of Report")
+    lines.append("=" * 120)
+    lines.append("")
     
-    logger.info(f"Saved TXT report: {txt_path}")
+    # Single write of the whole report
+    txt_path.write_text("\n".join(lines), encoding="utf-8")
+    
+    logger.info("Saved TXT report: %s", txt_path)
 
 
-def save_csv_report(df: pd.DataFrame, csv_path: Path, previous_date: str, latest_date: str) -> None:
+def save_csv_report(
+    df: pd.DataFrame,
+    selections: ReportSelections,
+    csv_path: Path,
+    previous_date: str,
+    latest_date: str
+) -> None:
     """
     Save CSV report with all data.
     
     Args:
         df: DataFrame with change metrics
+        selections: Precomputed CSV row order
         csv_path: Output file path
         previous_date: Previous date string
         latest_date: Latest date string
     """
-    # Add metadata columns
-    output_df = df.copy()
-    output_df['report_date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    output_df['previous_date'] = previous_date
-    output_df['latest_date'] = latest_date
-    
-    # Reorder columns for better readability
-    columns = [
-        'domain_name',
-        'prev_users', 'latest_users', 'users_change', 'users_pct_change',
-        'prev_views', 'latest_views', 'views_change', 'views_pct_change',
-        'report_date', 'previous_date', 'latest_date'
-    ]
+    # Build the output directly as an Arrow table in the final column order;
+    # the frame's columns are already Arrow/numpy buffers, so no pandas
+    # copy, assign or sort is needed
+    table = pa.Table.from_pandas(df, columns=CSV_DATA_COLUMNS, preserve_index=False)
     
-    output_df = output_df[columns]
+    # Add metadata columns as single-entry dictionary columns, so each
+    # constant is stored once instead of once per row
+    metadata = {
+        'report_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'previous_date': previous_date,
+        'latest_date': latest_date
+    }
+    indices = pa.array(np.zeros(table.num_rows, dtype=np.int8))
+    for name, value in metadata.items():
+        table = table.append_column(name, pa.DictionaryArray.from_arrays(indices, pa.array([value])))
     
-    # Sort by users_change descending
-    output_df = output_df.sort_values('users_change', ascending=False)
+    # Rows ordered by users_change descending
+    table = table.take(pa.array(selections.csv_order))
     
-    # Save to CSV
-    output_df.to_csv(csv_path, index=False)
+    # Save to CSV with Arrow's C++ writer
+    pacsv.write_csv(table, str(csv_path), write_options=pacsv.WriteOptions(include_header=True))
     
-    logger.info(f"Saved CSV report: {csv_path}")
+    logger.info("Saved CSV report: %s", csv_path)
 
 
 # ============================================================================
@@ -521,23 +807,23 @@ def main() -> int:
         ensure_directories()
         
         # Connect to BigQuery
-        client = get_bigquery_client()
+        client, bqstorage_client = get_bigquery_client()
         
-        # Get recent dates
-        previous_date, latest_date = get_recent_dates(client)
-        
-        # Extract data
-        df = extract_domain_data(client, previous_date, latest_date)
+        # Extract pivoted data for the two most recent dates
+        df, previous_date, latest_date = extract_domain_data(client, bqstorage_client)
         
         # Calculate changes
-        changes_df = calculate_changes(df, previous_date, latest_date)
+        changes_df = calculate_changes(df)
         
         # Generate output filenames
         txt_path, csv_path = get_output_filenames()
         
+        # Select report rows once for both reports
+        selections = select_report_rows(changes_df)
+        
         # Save reports
-        save_txt_report(changes_df, txt_path, previous_date, latest_date)
-        save_csv_report(changes_df, csv_path, previous_date, latest_date)
+        save_txt_report(changes_df, selections, txt_path, previous_date, latest_date)
+        save_csv_report(changes_df, selections, csv_path, previous_date, latest_date)
         
         # Cleanup old files
         cleanup_old_files()
@@ -545,22 +831,22 @@ def main() -> int:
         # Success
         logger.info("=" * 80)
         logger.info("Script completed successfully")
-        logger.info(f"TXT Report: {txt_path}")
-        logger.info(f"CSV Report: {csv_path}")
+        logger.info("TXT Report: %s", txt_path)
+        logger.info("CSV Report: %s", csv_path)
         logger.info("=" * 80)
         
         return 0
         
     except FileNotFoundError as e:
-        logger.error(f"Configuration error: {e}")
+        logger.error("Configuration error: %s", e)
         return 1
         
     except ValueError as e:
-        logger.error(f"Data error: {e}")
+        logger.error("Data error: %s", e)
         return 1
         
     except Exception as e:
-        logger.error(f"Unexpected error: {e}", exc_info=True)
+        logger.error("Unexpected error: %s", e, exc_info=True)
         return 1
 
 